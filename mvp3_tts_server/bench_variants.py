@@ -1,11 +1,20 @@
+import contextlib
+import http.client
 import json
 import os
 import sys
+import threading
 import time
 import traceback
-import urllib.request
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, TextIO
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 CASES = [
     "Collect wood and set up a starter base.",
@@ -16,22 +25,86 @@ CASES = [
 
 VARIANTS = ["stub", "qwen_base", "qwen_voice_design", "qwen_custom_voice"]
 
+_STATM_PATH = Path("/proc/self/statm")
+_HAS_STATM = _STATM_PATH.exists()
+_PAGE_SIZE_KB = os.sysconf("SC_PAGE_SIZE") // 1024 if hasattr(os, "sysconf") else 4
+
+_thread_local = threading.local()
+_all_connections: list[http.client.HTTPConnection] = []
+_all_connections_lock = threading.Lock()
+
+
+# A keep-alive connection the server already closed only fails on first use.
+_STALE_CONNECTION_ERRORS = (BrokenPipeError, ConnectionResetError, http.client.RemoteDisconnected)
 
-def post_json(url: str, payload: dict[str, Any]) -> dict[str, Any]:
-    req = urllib.request.Request(
-        url=url,
-        data=json.dumps(payload).encode("utf-8"),
-        headers={"Content-Type": "application/json"},
-        method="POST",
+
+def _connection(base_url: str) -> http.client.HTTPConnection:
+    conns: dict[tuple[str, str], http.client.HTTPConnection] | None = getattr(
+        _thread_local, "conns", None
     )
-    with urllib.request.urlopen(req, timeout=30) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    if conns is None:
+        conns = {}
+        _thread_local.conns = conns
+
+    parts = urllib.parse.urlsplit(base_url)
+    key = (parts.scheme, parts.netloc)
+    conn = conns.get(key)
+    if conn is None:
+        conn_cls = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        conn = conn_cls(parts.netloc, timeout=30)
+        conns[key] = conn
+        with _all_connections_lock:
+            _all_connections.append(conn)
+    return conn
+
+
+@contextlib.contextmanager
+def pooled_connections() -> Iterator[None]:
+    # Closes every worker's keep-alive connection once the pool is done with them.
+    try:
+        yield
+    finally:
+        with _all_connections_lock:
+            for conn in _all_connections:
+                conn.close()
+            _all_connections.clear()
 
 
-def current_rss_kb() -> int | None:
+def _send(conn: http.client.HTTPConnection, path: str, body: bytes) -> tuple[dict[str, str], bytes]:
+    try:
+        conn.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        data = resp.read()
+    except (OSError, http.client.HTTPException):
+        conn.close()
+        raise
+
+    if resp.status != 200:
+        raise OSError(f"HTTP {resp.status} {resp.reason}")
+    return {k.lower(): v for k, v in resp.getheaders()}, data
+
+
+def post_tts(base_url: str, path: str, payload: dict[str, Any]) -> tuple[dict[str, str], bytes]:
+    # One keep-alive connection per worker thread and host. A reused connection
+    # that turns out to be stale is reconnected and the request retried once.
+    body = json.dumps(payload).encode("utf-8")
+    conn = _connection(base_url)
+    reused = conn.sock is not None
     try:
-        import resource
-    except ImportError:
+        return _send(conn, path, body)
+    except _STALE_CONNECTION_ERRORS:
+        if not reused:
+            raise
+    return _send(conn, path, body)
+
+
+def current_rss_kb() -> int | None:
+    if _HAS_STATM:
+        # Current (not peak) RSS, so each case reports its own footprint.
+        with _STATM_PATH.open("r", encoding="ascii") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE_KB
+
+    if resource is None:
         return None
 
     usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
@@ -40,71 +113,88 @@ def current_rss_kb() -> int | None:
     return int(usage)
 
 
-def append_jsonl(path: Path, record: dict[str, Any]) -> None:
-    with path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=True) + "\n")
+def append_jsonl(f: TextIO, record: dict[str, Any]) -> None:
+    f.write(json.dumps(record, ensure_ascii=True) + "\n")
+
+
+def run_case(base_url: str, variant: str, text: str) -> dict[str, Any]:
+    request_started = time.perf_counter()
+    record: dict[str, Any] = {
+        "event": "tts_bench_case",
+        "variant": variant,
+        "text": text,
+        "sample_rate_hz": 48000,
+        "started_unix_ms": int(time.time() * 1000),
+        "success": False,
+        "ttft_ms": None,
+        "total_ms": None,
+        "request_elapsed_ms": None,
+        "failure": None,
+        "rss_kb": None,
+        "chunks": 0,
+        "utterances": 0,
+        "audio_bytes_len": 0,
+    }
+
+    try:
+        headers, wav = post_tts(
+            base_url,
+            "/v1/tts",
+            {"text": text, "sample_rate_hz": 48000, "engine": variant},
+        )
+        record["success"] = True
+        record["ttft_ms"] = int(headers["x-ttft-ms"])
+        record["total_ms"] = int(headers["x-total-ms"])
+        record["chunks"] = int(headers.get("x-chunk-count", "0"))
+        record["utterances"] = int(headers.get("x-utterance-count", "0"))
+        record["audio_bytes_len"] = len(wav)
+    except (OSError, http.client.HTTPException, KeyError, ValueError) as exc:
+        record["failure"] = f"{type(exc).__name__}: {exc}"
+        record["traceback"] = traceback.format_exc(limit=2)
+    finally:
+        record["request_elapsed_ms"] = int((time.perf_counter() - request_started) * 1000)
+        record["rss_kb"] = current_rss_kb()
+
+    return record
 
 
 def main() -> None:
     out_path = Path(os.getenv("MIQBOT_TTS_BENCH_OUT", "bench_results.jsonl"))
     base_url = os.getenv("MIQBOT_TTS_BENCH_URL", "http://127.0.0.1:40300")
+    concurrency = int(os.getenv("MIQBOT_TTS_BENCH_CONCURRENCY", "8"))
 
     total = 0
     failed = 0
     started_unix_ms = int(time.time() * 1000)
 
-    for variant in VARIANTS:
-        for text in CASES:
+    # Records are harvested and written on this thread only, so the output
+    # file needs no locking.
+    with (
+        out_path.open("a", buffering=64 * 1024, encoding="utf-8") as out,
+        pooled_connections(),
+        ThreadPoolExecutor(max_workers=max(1, concurrency)) as ex,
+    ):
+        futures = [
+            ex.submit(run_case, base_url, variant, text) for variant in VARIANTS for text in CASES
+        ]
+        for future in as_completed(futures):
+            record = future.result()
             total += 1
-            request_started = time.perf_counter()
-            record: dict[str, Any] = {
-                "event": "tts_bench_case",
-                "variant": variant,
-                "text": text,
-                "sample_rate_hz": 48000,
-                "started_unix_ms": int(time.time() * 1000),
-                "success": False,
-                "ttft_ms": None,
-                "total_ms": None,
-                "request_elapsed_ms": None,
-                "failure": None,
-                "rss_kb": None,
-                "chunks": 0,
-                "utterances": 0,
-                "audio_bytes_b64_len": 0,
-            }
-
-            try:
-                body = post_json(
-                    f"{base_url}/v1/tts_with_meta",
-                    {"text": text, "sample_rate_hz": 48000, "engine": variant},
-                )
-                record["success"] = True
-                record["ttft_ms"] = body.get("ttft_ms")
-                record["total_ms"] = body.get("total_ms")
-                record["chunks"] = len(body.get("chunks", []))
-                record["utterances"] = len(body.get("utterances", []))
-                record["audio_bytes_b64_len"] = len(body.get("audio_wav_base64", ""))
-            except (OSError, ValueError, TimeoutError) as exc:
+            if not record["success"]:
                 failed += 1
-                record["failure"] = f"{type(exc).__name__}: {exc}"
-                record["traceback"] = traceback.format_exc(limit=2)
-            finally:
-                record["request_elapsed_ms"] = int((time.perf_counter() - request_started) * 1000)
-                record["rss_kb"] = current_rss_kb()
-                append_jsonl(out_path, record)
-                print(record)
-
-    summary = {
-        "event": "tts_bench_summary",
-        "started_unix_ms": started_unix_ms,
-        "finished_unix_ms": int(time.time() * 1000),
-        "total_cases": total,
-        "failed_cases": failed,
-        "failure_rate": (failed / total) if total else 0.0,
-    }
-    append_jsonl(out_path, summary)
-    print(summary)
+            append_jsonl(out, record)
+            print(record)
+
+        summary = {
+            "event": "tts_bench_summary",
+            "started_unix_ms": started_unix_ms,
+            "finished_unix_ms": int(time.time() * 1000),
+            "total_cases": total,
+            "failed_cases": failed,
+            "failure_rate": (failed / total) if total else 0.0,
+        }
+        append_jsonl(out, summary)
+        print(summary)
 
 
 if __name__ == "__main__":
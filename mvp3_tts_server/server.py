@@ -1,17 +1,19 @@
 import base64
-import io
-import math
+import functools
 import os
+import re
+import struct
 import time
-import wave
 from dataclasses import dataclass
+from fractions import Fraction
 from typing import List, Optional
 
+import numpy as np
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import ORJSONResponse, Response
 from pydantic import BaseModel, Field
 
-app = FastAPI(title="MiqBOT TTS Server (MVP-9)")
+app = FastAPI(title="MiqBOT TTS Server (MVP-9)", default_response_class=ORJSONResponse)
 
 
 class TtsRequest(BaseModel):
@@ -34,6 +36,45 @@ class TtsEngine:
         raise NotImplementedError
 
 
+WAV_HEADER_FMT = "<4sI4s4sIHHIIHH4sI"
+
+
+def wav_pcm16_mono(pcm: bytes, sample_rate_hz: int) -> bytes:
+    header = struct.pack(
+        WAV_HEADER_FMT,
+        b"RIFF",
+        36 + len(pcm),
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,
+        1,
+        sample_rate_hz,
+        sample_rate_hz * 2,
+        2,
+        16,
+        b"data",
+        len(pcm),
+    )
+    return header + pcm
+
+
+STUB_AMPLITUDE = 0.2
+
+
+@functools.lru_cache(maxsize=32)
+def tone_period(freq_hz: float, sample_rate_hz: int) -> np.ndarray:
+    # Shortest sample run holding a whole number of cycles, so tiling it is
+    # seamless. The ratio is capped at sample_rate_hz, i.e. at most 1 second.
+    ratio = Fraction(freq_hz / sample_rate_hz).limit_denominator(sample_rate_hz)
+    n = np.arange(ratio.denominator, dtype=np.float64)
+    period = np.rint(
+        STUB_AMPLITUDE * 32767 * np.sin(2.0 * np.pi * ratio.numerator * n / ratio.denominator)
+    ).astype("<i2")
+    period.setflags(write=False)
+    return period
+
+
 class StubEngine(TtsEngine):
     def __init__(self, freq_hz: float) -> None:
         self.freq_hz = freq_hz
@@ -43,32 +84,20 @@ class StubEngine(TtsEngine):
 
         n_chars = max(1, len(text))
         duration_s = min(4.0, 0.15 + 0.03 * n_chars)
-        amp = 0.2
         n_samples = int(sample_rate_hz * duration_s)
 
         # MVP-9 placeholder timing model for TTFT/total metrics.
         ttft_ms = int(min(300, 40 + n_chars * 2))
 
-        buf = io.BytesIO()
-        with wave.open(buf, "wb") as wf:
-            wf.setnchannels(1)
-            wf.setsampwidth(2)
-            wf.setframerate(sample_rate_hz)
-
-            frames = bytearray()
-            for i in range(n_samples):
-                t = i / sample_rate_hz
-                s = amp * math.sin(2.0 * math.pi * self.freq_hz * t)
-                v = int(max(-1.0, min(1.0, s)) * 32767)
-                frames.extend(v.to_bytes(2, byteorder="little", signed=True))
-            wf.writeframes(frames)
+        pcm = np.resize(tone_period(self.freq_hz, sample_rate_hz), n_samples)
+        wav_bytes = wav_pcm16_mono(pcm.tobytes(), sample_rate_hz)
 
         total_ms = int((time.perf_counter() - started) * 1000)
         utterances = [seg for seg in split_sentences(text) if seg]
         chunks = [seg[:13] for seg in utterances] if utterances else [text[:13]]
 
         return SynthesisResult(
-            wav_bytes=buf.getvalue(),
+            wav_bytes=wav_bytes,
             ttft_ms=max(ttft_ms, 1),
             total_ms=max(total_ms, 1),
             utterances=utterances or [text],
@@ -76,26 +105,24 @@ class StubEngine(TtsEngine):
         )
 
 
+_SENTENCE_RE = re.compile(r"[^.!?\n]*[.!?\n]|[^.!?\n]+$")
+
+
 def split_sentences(text: str) -> List[str]:
-    out: List[str] = []
-    current = []
-    seps = set(".!?\n")
-    for ch in text:
-        current.append(ch)
-        if ch in seps:
-            seg = "".join(current).strip()
-            if seg:
-                out.append(seg)
-            current = []
-    if current:
-        seg = "".join(current).strip()
-        if seg:
-            out.append(seg)
-    return out
+    return [seg for seg in (m.group(0).strip() for m in _SENTENCE_RE.finditer(text)) if seg]
+
+
+ENGINE_MODES = ("stub", "qwen_base", "qwen_voice_design", "qwen_custom_voice")
 
 
 def build_engine(mode: str) -> TtsEngine:
     mode = mode.strip().lower()
+    # Unknown modes share the stub entry so client input cannot grow the cache.
+    return _cached_engine(mode if mode in ENGINE_MODES else "stub")
+
+
+@functools.lru_cache(maxsize=len(ENGINE_MODES))
+def _cached_engine(mode: str) -> TtsEngine:
     if mode == "qwen_base":
         # Placeholder until Qwen runtime integration is wired.
         return StubEngine(freq_hz=460.0)
@@ -113,16 +140,33 @@ def get_engine(req: TtsRequest) -> TtsEngine:
     return build_engine(req.engine or DEFAULT_ENGINE)
 
 
+@app.on_event("startup")
+def warm_engine() -> None:
+    # Build the default engine and run one short synthesis so the first real
+    # request does not pay construction or first-call costs.
+    build_engine(DEFAULT_ENGINE).synthesize("warmup.", 48000)
+
+
 @app.post("/v1/tts")
 def tts(req: TtsRequest) -> Response:
     res = get_engine(req).synthesize(req.text, req.sample_rate_hz)
-    return Response(content=res.wav_bytes, media_type="audio/wav")
+    return Response(
+        content=res.wav_bytes,
+        media_type="audio/wav",
+        headers={
+            "X-TTFT-Ms": str(res.ttft_ms),
+            "X-Total-Ms": str(res.total_ms),
+            # Counts only: echoing the text here would bloat headers past proxy limits.
+            "X-Utterance-Count": str(len(res.utterances)),
+            "X-Chunk-Count": str(len(res.chunks)),
+        },
+    )
 
 
 @app.post("/v1/tts_with_meta")
-def tts_with_meta(req: TtsRequest) -> JSONResponse:
+def tts_with_meta(req: TtsRequest) -> ORJSONResponse:
     res = get_engine(req).synthesize(req.text, req.sample_rate_hz)
-    return JSONResponse(
+    return ORJSONResponse(
         {
             "ttft_ms": res.ttft_ms,
             "total_ms": res.total_ms,
@@ -1,10 +1,12 @@
-﻿import base64
+﻿import asyncio
+import base64
+import contextlib
 import hashlib
-import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
 
+import orjson
 import websockets
 
 
@@ -44,30 +46,39 @@ def wrap_fixed(text: str, line_max: int) -> str:
     if not text:
         return ""
 
-    lines: list[str] = []
-    buf = ""
+    step = max(1, line_max)
+    return "\n".join(
+        part[i : i + step] for part in text.split("\n") for i in range(0, len(part), step)
+    )
 
-    for ch in text:
-        if ch == "\n":
-            if buf:
-                lines.append(buf)
-                buf = ""
-            continue
 
-        if len(buf) >= line_max:
-            lines.append(buf)
-            buf = ""
+def visible_char_count(text: str) -> int:
+    return len(text) - text.count("\n") - text.count("\r")
+
 
-        buf += ch
+# obs-websocket caps a single Sleep request at 50s in SerialRealtime batches.
+OBS_SLEEP_MAX_MS = 50000
 
-    if buf:
-        lines.append(buf)
 
-    return "\n".join(lines)
+def text_input_request(input_name: str, text: str) -> dict[str, Any]:
+    return {
+        "requestType": "SetInputSettings",
+        "requestData": {
+            "inputName": input_name,
+            "inputSettings": {"text": text},
+            "overlay": True,
+        },
+    }
 
 
-def visible_char_count(text: str) -> int:
-    return sum(1 for ch in text if ch not in ["\n", "\r"])
+def sleep_requests(seconds: float) -> list[dict[str, Any]]:
+    remaining_ms = max(0, int(seconds * 1000))
+    requests: list[dict[str, Any]] = []
+    while remaining_ms > 0:
+        sleep_ms = min(remaining_ms, OBS_SLEEP_MAX_MS)
+        requests.append({"requestType": "Sleep", "requestData": {"sleepMillis": sleep_ms}})
+        remaining_ms -= sleep_ms
+    return requests
 
 
 @dataclass
@@ -77,9 +88,16 @@ class ObsClient:
     rpc_version: int = 1
     ws: websockets.WebSocketClientProtocol | None = None
     req_id: int = 0
+    _pending: dict[str, asyncio.Future] = field(default_factory=dict, repr=False)
+    _reader: asyncio.Task | None = field(default=None, repr=False)
+
+    @property
+    def connected(self) -> bool:
+        return self.ws is not None and self._reader is not None and not self._reader.done()
 
     async def connect(self) -> None:
-        self.ws = await websockets.connect(self.url)
+        # Loopback to OBS: permessage-deflate only costs CPU.
+        self.ws = await websockets.connect(self.url, compression=None)
         hello = await self._recv_json()
         if hello.get("op") != 0:
             raise RuntimeError(f"Expected Hello(op=0), got: {hello}")
@@ -96,45 +114,127 @@ class ObsClient:
         if identified.get("op") != 2:
             raise RuntimeError(f"Expected Identified(op=2), got: {identified}")
 
-    async def set_text_input(self, input_name: str, text: str) -> None:
-        self.req_id += 1
-        request_id = f"req-{self.req_id}"
-
-        payload = {
-            "op": 6,
-            "d": {
-                "requestType": "SetInputSettings",
-                "requestId": request_id,
-                "requestData": {
-                    "inputName": input_name,
-                    "inputSettings": {"text": text},
-                    "overlay": True,
-                },
-            },
-        }
-        await self._send_json(payload)
+        self._reader = asyncio.create_task(self._read_loop())
 
-        res = await self._recv_json()
+    async def set_text_input(self, input_name: str, text: str) -> None:
+        res = await self._request(6, text_input_request(input_name, text))
         if res.get("op") != 7:
             raise RuntimeError(f"Expected RequestResponse(op=7), got: {res}")
-        if res.get("d", {}).get("requestId") != request_id:
-            raise RuntimeError(f"Mismatched requestId: {res}")
 
-        status = res.get("d", {}).get("requestStatus", {})
-        if not status.get("result", False):
+        d = res.get("d")
+        status = d.get("requestStatus") if isinstance(d, dict) else None
+        if not isinstance(status, dict) or not status.get("result", False):
             raise RuntimeError(f"OBS request failed: {status}")
 
+    async def show_text_for(self, input_name: str, text: str, show_s: float) -> None:
+        await self.request_batch(
+            [
+                text_input_request(input_name, text),
+                *sleep_requests(show_s),
+                text_input_request(input_name, ""),
+            ]
+        )
+
+    async def request_batch(
+        self, requests: list[dict[str, Any]], halt_on_failure: bool = True
+    ) -> list[dict[str, Any]]:
+        res = await self._request(
+            8,
+            {
+                "haltOnFailure": halt_on_failure,
+                # SerialRealtime, required for Sleep(sleepMillis).
+                "executionType": 0,
+                "requests": requests,
+            },
+        )
+        if res.get("op") != 9:
+            raise RuntimeError(f"Expected RequestBatchResponse(op=9), got: {res}")
+
+        d = res.get("d")
+        results = d.get("results") if isinstance(d, dict) else None
+        if not isinstance(results, list):
+            raise RuntimeError(f"Malformed RequestBatchResponse: {res}")
+        for result in results:
+            if not isinstance(result, dict):
+                raise RuntimeError(f"Malformed RequestBatchResponse result: {result}")
+            status = result.get("requestStatus")
+            if not isinstance(status, dict) or not status.get("result", False):
+                raise RuntimeError(f"OBS batch request {result.get('requestType')} failed: {status}")
+        return results
+
     async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+            # A reader that already failed re-raises here; it has logged the
+            # failure itself, and the socket must still be closed below.
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._reader
+            self._reader = None
         if self.ws:
             await self.ws.close()
 
+    def _next_request_id(self) -> str:
+        self.req_id += 1
+        return f"req-{self.req_id}"
+
+    async def _request(self, op: int, data: dict[str, Any]) -> dict[str, Any]:
+        if self._reader is None or self._reader.done():
+            raise RuntimeError("OBS reader is not running")
+
+        request_id = self._next_request_id()
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = fut
+        try:
+            await self._send_json({"op": op, "d": {**data, "requestId": request_id}})
+            return await fut
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _read_loop(self) -> None:
+        # Sole consumer of the socket after Identify: routes op=7/op=9 responses
+        # to their waiting request by requestId and drops everything else.
+        # Malformed frames are logged and skipped; only a closed socket (or an
+        # unexpected bug) ends the loop.
+        error: Exception = RuntimeError("OBS client closed")
+        try:
+            while True:
+                try:
+                    res = await self._recv_json()
+                except ValueError as exc:
+                    print(f"[OBS] skipping undecodable frame: {exc}")
+                    continue
+                if not isinstance(res, dict):
+                    print(f"[OBS] skipping non-object frame: {res!r}")
+                    continue
+                if res.get("op") not in (7, 9):
+                    continue
+                d = res.get("d")
+                request_id = d.get("requestId") if isinstance(d, dict) else None
+                if not isinstance(request_id, str):
+                    print(f"[OBS] skipping response without requestId: {res!r}")
+                    continue
+                fut = self._pending.get(request_id)
+                if fut is not None and not fut.done():
+                    fut.set_result(res)
+        except websockets.ConnectionClosed as exc:
+            error = RuntimeError(f"OBS websocket closed: {exc}")
+        except Exception as exc:
+            print(f"[OBS] reader failed: {exc!r}")
+            error = RuntimeError(f"OBS reader failed: {exc!r}")
+            raise
+        finally:
+            for fut in self._pending.values():
+                if not fut.done():
+                    fut.set_exception(error)
+
     async def _send_json(self, obj: dict[str, Any]) -> None:
         if self.ws is None:
             raise RuntimeError("WebSocket not connected")
-        await self.ws.send(json.dumps(obj))
+        # obs-websocket's JSON subprotocol expects text frames, so send str, not bytes.
+        await self.ws.send(orjson.dumps(obj).decode("utf-8"))
 
     async def _recv_json(self) -> dict[str, Any]:
         if self.ws is None:
             raise RuntimeError("WebSocket not connected")
         msg = await self.ws.recv()
-        return json.loads(msg)
+        return orjson.loads(msg)
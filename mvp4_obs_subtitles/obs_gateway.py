@@ -1,11 +1,11 @@
 ﻿import asyncio
 import contextlib
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Optional
 
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 
 from obs_common import ObsClient, load_properties, visible_char_count, wrap_fixed
@@ -24,10 +24,9 @@ class GatewayState:
     request_seq: int = 0
     generation: int = 0
     clear_task: Optional[asyncio.Task] = None
-    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
 
 
-app = FastAPI(title="MiqBOT OBS Subtitle Gateway (MVP-5)")
+app = FastAPI(title="MiqBOT OBS Subtitle Gateway (MVP-5)", default_response_class=ORJSONResponse)
 state = GatewayState()
 
 
@@ -55,13 +54,13 @@ async def shutdown() -> None:
 
 
 @app.get("/healthz")
-async def healthz() -> JSONResponse:
-    ok = state.obs is not None and state.obs.ws is not None
-    return JSONResponse({"ok": ok})
+async def healthz() -> ORJSONResponse:
+    ok = state.obs is not None and state.obs.connected
+    return ORJSONResponse({"ok": ok})
 
 
 @app.post("/v1/subtitle")
-async def post_subtitle(req: SubtitleReq) -> JSONResponse:
+async def post_subtitle(req: SubtitleReq) -> ORJSONResponse:
     if state.obs is None:
         raise RuntimeError("OBS client is not initialized")
 
@@ -69,21 +68,25 @@ async def post_subtitle(req: SubtitleReq) -> JSONResponse:
     chars = visible_char_count(wrapped)
     show_s = max(0.0, chars * state.min_sec_per_char)
 
-    async with state.lock:
-        state.request_seq += 1
-        request_id = f"sub-{state.request_seq}"
-        state.generation += 1
-        generation = state.generation
+    # No lock: the counters are bumped without yielding, and stale clear tasks
+    # become no-ops through the generation check, so posts can overlap on OBS.
+    state.request_seq += 1
+    request_id = f"sub-{state.request_seq}"
+    state.generation += 1
+    generation = state.generation
 
-        if state.clear_task and not state.clear_task.done():
-            state.clear_task.cancel()
-            with contextlib.suppress(asyncio.CancelledError):
-                await state.clear_task
+    if state.clear_task and not state.clear_task.done():
+        state.clear_task.cancel()
 
+    try:
         await state.obs.set_text_input(state.input_name, wrapped)
-        state.clear_task = asyncio.create_task(_clear_after(show_s, request_id, generation))
+    finally:
+        # Scheduled even when the set fails: an overtaken earlier post skipped
+        # its own clear, so this generation must still clear what is on screen.
+        if generation == state.generation:
+            state.clear_task = asyncio.create_task(_clear_after(show_s, request_id, generation))
 
-    return JSONResponse(
+    return ORJSONResponse(
         {
             "ok": True,
             "request_id": request_id,
@@ -97,12 +100,11 @@ async def post_subtitle(req: SubtitleReq) -> JSONResponse:
 async def _clear_after(show_s: float, request_id: str, generation: int) -> None:
     try:
         await asyncio.sleep(show_s)
-        async with state.lock:
-            if generation != state.generation:
-                return
-            if state.obs is None:
-                return
-            await state.obs.set_text_input(state.input_name, "")
+        if generation != state.generation:
+            return
+        if state.obs is None:
+            return
+        await state.obs.set_text_input(state.input_name, "")
     except asyncio.CancelledError:
         return
     except (RuntimeError, ValueError, OSError) as exc:
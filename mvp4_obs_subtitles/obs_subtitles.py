@@ -27,9 +27,7 @@ async def main() -> None:
             chars = visible_char_count(wrapped)
             show_s = max(0.0, chars * min_sec_per_char)
 
-            await obs.set_text_input(input_name, wrapped)
-            await asyncio.sleep(show_s)
-            await obs.set_text_input(input_name, "")
+            await obs.show_text_for(input_name, wrapped, show_s)
     except KeyboardInterrupt:
         pass
     finally: